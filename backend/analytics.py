@@ -0,0 +1,160 @@
+import numpy as np
+from scipy import sparse
+
+DAMPING = 0.85
+PAGERANK_TOL = 1e-8
+PAGERANK_MAX_ITER = 100
+PROPAGATION_MAX_ITER = 30
+# Label propagation stops once fewer than this share of nodes change label.
+PROPAGATION_TOL = 1e-3
+# Weight of a node's own label when it picks the most common neighbouring one;
+# damps the oscillation synchronous label propagation is prone to.
+SELF_WEIGHT = 0.5
+# Share of nodes, by importance, drawn at each size (3 is largest); the rest
+# are size 1. Matches the three radii MindMap.tsx draws.
+SIZE_SHARES = {3: 0.15, 2: 0.35}
+
+
+def adjacency(n, src, dst):
+    # Symmetric 0/1 adjacency matrix without self-loops.
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    keep = src != dst
+    rows = np.concatenate((src[keep], dst[keep]))
+    cols = np.concatenate((dst[keep], src[keep]))
+    adj = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+    adj.data[:] = 1.0
+    return adj
+
+
+def row_argmax(matrix):
+    # Column of the largest entry in each row of a CSR matrix, or -1 for an
+    # empty row. Vectorized; scipy's own argmax loops over rows in Python.
+    matrix = matrix.tocsr()
+    matrix.sum_duplicates()
+    n = matrix.shape[0]
+    lengths = np.diff(matrix.indptr)
+    result = np.full(n, -1, dtype=np.int64)
+    filled = lengths > 0
+    if not filled.any():
+        return result
+    rows = np.repeat(np.arange(n), lengths)
+    row_max = np.full(n, -np.inf)
+    row_max[filled] = np.maximum.reduceat(matrix.data, matrix.indptr[:-1][filled])
+    hits = np.flatnonzero(matrix.data == row_max[rows])
+    hit_rows, first = np.unique(rows[hits], return_index=True)
+    result[hit_rows] = matrix.indices[hits[first]]
+    return result
+
+
+def pagerank(adj, damping=DAMPING, tol=PAGERANK_TOL, max_iter=PAGERANK_MAX_ITER):
+    # Power iteration; rank held by nodes without edges is spread evenly.
+    n = adj.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out_degree = np.asarray(adj.sum(axis=1)).ravel()
+    dangling = out_degree == 0
+    inverse = np.where(dangling, 0.0, 1.0 / np.maximum(out_degree, 1))
+    transition = adj.T.tocsr()
+
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        spread = damping * rank[dangling].sum() + (1 - damping)
+        updated = damping * (transition @ (rank * inverse)) + spread / n
+        if np.abs(updated - rank).sum() < tol * n:
+            return updated
+        rank = updated
+    return rank
+
+
+def label_propagation(adj, max_iter=PROPAGATION_MAX_ITER, seed=0):
+    # Each round, every node adopts the label most common among its
+    # neighbours (ties broken by a fixed random jitter). One round is a single
+    # sparse product, so the cost is linear in the number of edges. Returns
+    # community ids numbered 0..k-1.
+    n = adj.shape[0]
+    labels = np.arange(n)
+    if n == 0:
+        return labels
+    jitter = np.random.default_rng(seed).random(n) * 1e-3
+    nodes = np.arange(n)
+    for _ in range(max_iter):
+        own = sparse.csr_matrix((np.full(n, SELF_WEIGHT), (nodes, labels)), shape=(n, n))
+        votes = (adj @ sparse.csr_matrix((np.ones(n), (nodes, labels)), shape=(n, n)) + own).tocsr()
+        votes.data += jitter[votes.indices]
+        updated = row_argmax(votes)
+        changed = np.count_nonzero(updated != labels)
+        labels = updated
+        if changed <= PROPAGATION_TOL * n:
+            break
+    return np.unique(labels, return_inverse=True)[1].ravel()
+
+
+def importance_sizes(rank):
+    # Maps importance to the frontend's 1-3 node sizes by rank percentile.
+    n = len(rank)
+    sizes = np.ones(n, dtype=np.int64)
+    if n == 0:
+        return sizes
+    order = np.argsort(-rank, kind="stable")
+    large = int(round(n * SIZE_SHARES[3]))
+    medium = int(round(n * SIZE_SHARES[2]))
+    sizes[order[:large]] = 3
+    sizes[order[large:large + medium]] = 2
+    return sizes
+
+
+def canonical_topics(communities, topics, rank, titles):
+    # One topic per community: the existing topic with the most importance
+    # behind it, or the title of its most important member if none has one.
+    topic_names, topic_ids = np.unique(np.asarray(topics, dtype=object).astype(str), return_inverse=True)
+    topic_ids = topic_ids.ravel()
+    k = int(communities.max()) + 1
+    weight = rank + 1e-12
+    labelled = topic_names[topic_ids] != ""
+    votes = sparse.csr_matrix(
+        (weight[labelled], (communities[labelled], topic_ids[labelled])),
+        shape=(k, len(topic_names)),
+    )
+    best_topic = row_argmax(votes)
+    has_topic = best_topic >= 0
+
+    # Most important member of each community, for communities with no topic.
+    order = np.lexsort((-rank, communities))
+    _, first = np.unique(communities[order], return_index=True)
+    leader = order[first]
+
+    names = [
+        str(topic_names[best_topic[c]]) if has_topic[c] else titles[leader[c]]
+        for c in range(k)
+    ]
+    return [names[c] for c in communities]
+
+
+def graph_annotations(nodes, edges):
+    # Size and canonical topic per node, as [{"title", "size", "topic"}].
+    if not nodes:
+        return []
+    titles = [node["title"] for node in nodes]
+    index = {title: i for i, title in enumerate(titles)}
+    pairs = [
+        (index[edge["source"]], index[edge["target"]])
+        for edge in edges
+        if edge["source"] in index and edge["target"] in index
+    ]
+    src, dst = (np.array(column, dtype=np.int64) for column in zip(*pairs)) if pairs else ([], [])
+
+    adj = adjacency(len(nodes), src, dst)
+    rank = pagerank(adj)
+    sizes = importance_sizes(rank)
+    topics = canonical_topics(label_propagation(adj), [node.get("topic") or "" for node in nodes], rank, titles)
+    return [
+        {"title": title, "size": size, "topic": topic}
+        for title, size, topic in zip(titles, sizes.tolist(), topics)
+    ]
+
+
+def apply_annotations(nodes, annotations):
+    for node, annotation in zip(nodes, annotations):
+        node["size"] = annotation["size"]
+        node["topic"] = annotation["topic"]
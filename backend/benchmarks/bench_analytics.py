@@ -0,0 +1,65 @@
+# Times PageRank and label propagation on random sparse graphs to show the
+# cost grows linearly with the number of edges.
+#
+#   python benchmarks/bench_analytics.py --edges 1000 10000 100000
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import adjacency, importance_sizes, label_propagation, pagerank  # noqa: E402
+
+
+def clustered_graph(n, m, clusters, rng):
+    # Most edges stay within a cluster, so there are communities to find.
+    cluster = rng.integers(0, clusters, n)
+    members = [np.flatnonzero(cluster == c) for c in range(clusters)]
+    src = rng.integers(0, n, m)
+    local = rng.random(m) < 0.9
+    dst = rng.integers(0, n, m)
+    for i in np.flatnonzero(local):
+        group = members[cluster[src[i]]]
+        dst[i] = group[rng.integers(0, len(group))]
+    return src, dst
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--degree", type=float, default=4.0, help="average edges per node")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'edges':>7} {'nodes':>6} {'pagerank ms':>12} {'propagation ms':>15} {'communities':>12} {'us/edge':>8}")
+    for m in args.edges:
+        n = max(int(m / args.degree), 2)
+        src, dst = clustered_graph(n, m, max(n // 50, 1), rng)
+        adj = adjacency(n, src, dst)
+        rank, rank_time = timed(lambda: pagerank(adj), args.repeat)
+        labels, label_time = timed(lambda: label_propagation(adj), args.repeat)
+        importance_sizes(rank)
+        total = rank_time + label_time
+        print(
+            f"{m:>7} {n:>6} {rank_time * 1000:>12.2f} {label_time * 1000:>15.2f} "
+            f"{labels.max() + 1:>12} {total / m * 1e6:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Times TF-IDF edge inference on synthetic mind-map nodes, for a full build
+# and for incremental insertion into an existing index, as one batch and one
+# node at a time.
+#
+#   python benchmarks/bench_edges.py --nodes 10000
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edges import EdgeIndex  # noqa: E402
+
+
+def synthetic_nodes(n, vocabulary, rng):
+    # Zipf-distributed words over a few hundred latent topics, so that nodes
+    # have realistic overlap.
+    words = [f"term{i}" for i in range(vocabulary)]
+    topics = rng.integers(0, vocabulary, size=(max(n // 25, 1), 30))
+    nodes = []
+    for i in range(n):
+        topic = topics[rng.integers(0, len(topics))]
+        picks = np.concatenate((
+            rng.choice(topic, size=8),
+            rng.zipf(1.3, size=8) % vocabulary,
+        ))
+        text = [words[p] for p in picks]
+        nodes.append({
+            "link": f"https://example.com/{i}",
+            "title": f"Node {i} " + " ".join(text[:3]),
+            "overview": " ".join(text[3:]),
+            "topic": "",
+        })
+    return nodes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--insert", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    nodes = synthetic_nodes(args.nodes + 2 * args.insert, args.vocabulary, rng)
+    base = nodes[: args.nodes]
+    extra = nodes[args.nodes: args.nodes + args.insert]
+    single = nodes[args.nodes + args.insert:]
+
+    index = EdgeIndex()
+    start = time.perf_counter()
+    edges = index.add(base)
+    build = time.perf_counter() - start
+    print(f"build   {args.nodes:>6} nodes  {build * 1000:8.1f} ms  {len(edges)} edges")
+
+    start = time.perf_counter()
+    added = index.add(extra)
+    insert = time.perf_counter() - start
+    print(f"insert  {len(extra):>6} nodes  {insert * 1000:8.1f} ms  {len(added)} edges")
+
+    start = time.perf_counter()
+    added = [edge for node in single for edge in index.add([node])]
+    insert = time.perf_counter() - start
+    print(f"single  {len(single):>6} nodes  {insert * 1000:8.1f} ms  {len(added)} edges")
+
+
+if __name__ == "__main__":
+    main()
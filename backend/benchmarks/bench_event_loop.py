@@ -0,0 +1,127 @@
+# Measures how responsive the event loop stays while CPU-bound layouts run.
+# Starts the app under uvicorn, probes /api/greeting while idle, then again
+# while clients keep POSTing large, uncached graphs to /api/layout. Run once
+# with the compute offloaded to worker processes and once in-process
+# (MINDMAP_WORKERS=0) for comparison.
+#
+#   python benchmarks/bench_event_loop.py --nodes 2000 --clients 4
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def random_graph(nodes, degree, seed):
+    rng = random.Random(seed)
+    titles = [f"node {seed}-{i}" for i in range(nodes)]
+    edges = [
+        {"source": titles[i], "target": titles[rng.randrange(nodes)]}
+        for i in range(nodes)
+        for _ in range(degree)
+    ]
+    return {"nodes": [{"title": title} for title in titles], "edges": edges}
+
+
+def start_server(port, workers, cache_dir):
+    env = dict(os.environ, MINDMAP_CACHE_DIR=cache_dir)
+    if workers is not None:
+        env["MINDMAP_WORKERS"] = str(workers)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND,
+        env=env,
+    )
+
+
+async def wait_ready(client):
+    for _ in range(300):
+        try:
+            await client.get("/api/greeting")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return f"p50 {pick(0.50):7.1f} ms  p95 {pick(0.95):7.1f} ms  p99 {pick(0.99):7.1f} ms  max {ordered[-1] * 1000:7.1f} ms"
+
+
+async def probe(client, duration, interval):
+    samples = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.get("/api/greeting")
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def load(client, args, worker, stop, statuses):
+    # Every request is a fresh graph so the layout cache never answers it.
+    seed = worker * 1_000_000
+    while not stop.is_set():
+        seed += 1
+        response = await client.post("/api/layout", json=random_graph(args.nodes, args.degree, seed))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 429:
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+
+async def bench_mode(args, workers):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = start_server(args.port, workers, cache_dir)
+        try:
+            limits = httpx.Limits(max_connections=args.clients + 4)
+            base = f"http://127.0.0.1:{args.port}"
+            async with httpx.AsyncClient(base_url=base, timeout=120, limits=limits) as client:
+                await wait_ready(client)
+                idle = await probe(client, args.seconds / 2, args.interval)
+
+                stop = asyncio.Event()
+                statuses = {}
+                loaders = [asyncio.create_task(load(client, args, i, stop, statuses)) for i in range(args.clients)]
+                await asyncio.sleep(0.5)
+                loaded = await probe(client, args.seconds, args.interval)
+                stop.set()
+                await asyncio.gather(*loaders)
+                stats = (await client.get("/api/compute/stats")).json()
+        finally:
+            server.terminate()
+            server.wait()
+
+    label = f"workers={workers}"
+    print(f"{label:<11} idle    {percentiles(idle)}")
+    print(f"{'':<11} loaded  {percentiles(loaded)}")
+    print(f"{'':<11} layouts {statuses}  pool {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--degree", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 1) - 1, 1))
+    parser.add_argument("--port", type=int, default=8711)
+    args = parser.parse_args()
+
+    for workers in (0, args.workers):
+        asyncio.run(bench_mode(args, workers))
+
+
+if __name__ == "__main__":
+    main()
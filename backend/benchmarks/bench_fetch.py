@@ -0,0 +1,142 @@
+# Drives the link-fetch pipeline against a local stand-in HTTP server and
+# reports pages/sec and peak RSS, for a cold pass and a conditional-GET pass.
+#
+#   python benchmarks/bench_fetch.py --urls 1000 --hosts 4
+
+import argparse
+import asyncio
+import hashlib
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import DiskStore  # noqa: E402
+from fetch import LinkFetcher  # noqa: E402
+
+PARAGRAPH = (
+    "<p>Pokémon trainers catch, raise and battle creatures across many regions. "
+    "Competitive play rewards careful team building, type coverage and prediction.</p>\n"
+)
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    page_bytes = 64 * 1024
+
+    def do_GET(self):
+        etag = '"' + hashlib.md5(self.path.encode()).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        head = (
+            f"<html><head><title>Page {self.path}</title>"
+            f'<meta name="description" content="Stand-in page {self.path}."></head><body>'
+        )
+        body = PARAGRAPH * (self.page_bytes // len(PARAGRAPH))
+        payload = (head + body + "</body></html>").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stops reading once it has enough text.
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class PageServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under the client's burst of
+    # concurrent requests.
+    request_queue_size = 256
+
+
+def serve(port):
+    server = PageServer(("127.0.0.1", port), PageHandler)
+    print("ready", flush=True)
+    server.serve_forever()
+
+
+def start_servers(base_port, hosts):
+    # Each stand-in host is a separate process on its own port, so neither its
+    # CPU time nor its memory is counted against the client.
+    servers = []
+    for port in range(base_port, base_port + hosts):
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        proc.stdout.readline()
+        servers.append(proc)
+    return servers
+
+
+async def run_pass(fetcher, urls):
+    start = time.perf_counter()
+    first = None
+    statuses = {}
+    async for page in fetcher.fetch_all(urls):
+        if first is None:
+            first = time.perf_counter() - start
+        statuses[page["status"]] = statuses.get(page["status"], 0) + 1
+    return time.perf_counter() - start, first, statuses
+
+
+async def bench(args):
+    urls = [
+        f"http://127.0.0.1:{args.port + i % args.hosts}/page/{i}"
+        for i in range(args.urls)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DiskStore(os.path.join(tmp, "pages.sqlite3"))
+        async with LinkFetcher(store=store, max_connections=args.concurrency, per_host=args.per_host) as fetcher:
+            for label in ("cold", "revalidate"):
+                elapsed, first, statuses = await run_pass(fetcher, urls)
+                print(
+                    f"{label:<11} {len(urls) / elapsed:8.1f} pages/s  "
+                    f"first result {first * 1000:6.1f} ms  statuses {statuses}"
+                )
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"peak RSS    {peak_kb / 1024:8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--urls", type=int, default=1000)
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--per-host", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8701)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    servers = start_servers(args.port, args.hosts)
+    try:
+        asyncio.run(bench(args))
+    finally:
+        for proc in servers:
+            proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Compares the grid-approximated layout against the exact O(n^2) reference.
+#
+#   python benchmarks/bench_layout.py --sizes 250 1000 2000 --iterations 100
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nuclear import layout_energy, simulate  # noqa: E402
+
+
+def random_graph(n, degree, rng):
+    # Sparse graph shaped like a mind map: a spanning tree plus random extras.
+    src = np.arange(1, n)
+    dst = rng.integers(0, np.maximum(src, 1))
+    extra = max(int(n * (degree / 2 - 1)), 0)
+    src = np.concatenate((src, rng.integers(0, n, extra)))
+    dst = np.concatenate((dst, rng.integers(0, n, extra)))
+    keep = src != dst
+    return src[keep], dst[keep]
+
+
+def run(n, iterations, method, src, dst, radii):
+    start = time.perf_counter()
+    pos = simulate(radii, src, dst, iterations=iterations, method=method)
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed, layout_energy(pos, src, dst)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 1000, 2000])
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--degree", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'nodes':>6} {'grid it/s':>10} {'exact it/s':>11} {'speedup':>8} {'energy diff':>12}")
+    for n in args.sizes:
+        src, dst = random_graph(n, args.degree, rng)
+        radii = rng.choice([14.0, 20.0, 28.0], size=n)
+        grid_rate, grid_energy = run(n, args.iterations, "grid", src, dst, radii)
+        exact_rate, exact_energy = run(n, args.iterations, "exact", src, dst, radii)
+        diff = (grid_energy - exact_energy) / abs(exact_energy)
+        print(f"{n:>6} {grid_rate:>10.1f} {exact_rate:>11.1f} {grid_rate / exact_rate:>7.1f}x {diff:>+11.2%}")
+
+
+if __name__ == "__main__":
+    main()
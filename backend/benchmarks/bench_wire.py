@@ -0,0 +1,75 @@
+# Payload bytes and serialize time of each graph wire format, for synthetic
+# graphs of increasing size.
+#
+#   python benchmarks/bench_wire.py --sizes 100 1000 10000
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wire import brotli, compress, msgpack, serialize_graph  # noqa: E402
+
+TOPICS = ["Fundamentals", "Mechanics", "Competitive", "Advanced Mechanics", "Tools", "Alternate Format"]
+WORDS = (
+    "pokemon trainer competitive team building guide official battle mechanics type "
+    "effectiveness breeding evolution strategy tournament rules database moves abilities"
+).split()
+
+
+def synthetic_graph(n, rng):
+    nodes = []
+    for i in range(n):
+        title = " ".join(rng.choice(WORDS).capitalize() for _ in range(5)) + f" ({i})"
+        nodes.append({
+            "link": f"https://www.example.com/wiki/{'_'.join(rng.choice(WORDS) for _ in range(3))}_{i}",
+            "title": title,
+            "overview": " ".join(rng.choice(WORDS) for _ in range(16)).capitalize() + ".",
+            "topic": rng.choice(TOPICS),
+        })
+    edges = []
+    for i in range(1, n):
+        for _ in range(2):
+            j = rng.randrange(i)
+            edges.append({"source": nodes[i]["title"], "target": nodes[j]["title"]})
+    return {"nodes": nodes, "edges": edges}
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    formats = ["json", "compact"] + (["msgpack"] if msgpack is not None else [])
+    encodings = [None, "gzip"] + (["br"] if brotli is not None else [])
+
+    rng = random.Random(args.seed)
+    print(f"{'nodes':>6} {'format':<8} {'encoding':<8} {'bytes':>10} {'serialize ms':>13} {'total ms':>9}")
+    for n in args.sizes:
+        graph = synthetic_graph(n, rng)
+        for fmt in formats:
+            (body, _), serialize = timed(lambda: serialize_graph(graph, fmt), args.repeat)
+            for encoding in encodings:
+                payload, squeeze = timed(lambda: compress(body, encoding), args.repeat)
+                print(
+                    f"{n:>6} {fmt:<8} {encoding or 'identity':<8} {len(payload):>10} "
+                    f"{serialize * 1000:>13.2f} {(serialize + squeeze) * 1000:>9.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
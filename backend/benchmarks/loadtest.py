@@ -0,0 +1,297 @@
+# Load test for the HTTP API. Starts the app under uvicorn (or targets a
+# running server with --url), drives each scenario with a fixed number of
+# concurrent clients and reports p50/p95/p99 latency, throughput and server
+# RSS. Results are written as JSON; pass an earlier file to --compare to flag
+# regressions.
+#
+#   python benchmarks/loadtest.py --concurrency 16 --requests 500
+#   python benchmarks/loadtest.py --compare benchmarks/results/baseline.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from bench_event_loop import BACKEND, random_graph, start_server, wait_ready
+
+RESULTS_DIR = os.path.join(BACKEND, "benchmarks", "results")
+QUERY = "pokemon"
+SCENARIOS = ("greeting", "search", "search-cold", "graph", "expand", "layout")
+DEFAULT_SCENARIOS = ("greeting", "search", "graph", "expand", "layout")
+RSS_INTERVAL = 0.1
+
+
+async def greeting(client, i, state):
+    return await client.get("/api/greeting")
+
+
+async def search(client, i, state):
+    # Reads the whole NDJSON stream; latency is time to the last frame.
+    async with client.stream("GET", "/api/search", params={"q": QUERY}) as response:
+        async for _ in response.aiter_bytes():
+            pass
+    return response
+
+
+async def search_cold(client, i, state):
+    # A new query every time, so nothing is served from the cache.
+    async with client.stream("GET", "/api/search", params={"q": f"{QUERY} {state['run']} {i}"}) as response:
+        async for _ in response.aiter_bytes():
+            pass
+    return response
+
+
+async def graph(client, i, state):
+    return await client.get(
+        "/api/graph", params={"q": QUERY, "format": "compact"}, headers={"Accept-Encoding": "gzip"}
+    )
+
+
+async def expand(client, i, state):
+    return await client.get("/api/expand", params={"node": state["link"], "depth": 2})
+
+
+async def layout(client, i, state):
+    # A new graph every time, so the layout cache never answers.
+    return await client.post("/api/layout", json=random_graph(state["layout_nodes"], 2, state["run"] + i))
+
+
+HANDLERS = {
+    "greeting": greeting,
+    "search": search,
+    "search-cold": search_cold,
+    "graph": graph,
+    "expand": expand,
+    "layout": layout,
+}
+
+
+def child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return [int(child) for child in children.read().split()]
+    except OSError:
+        return []
+
+
+def tree_rss(pid):
+    # Resident bytes of pid and all its descendants (the worker pool), or
+    # None where /proc is unavailable.
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as statm:
+                total += int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            if current == pid:
+                return None
+            continue
+        pending.extend(child_pids(current))
+    return total
+
+
+async def metrics_rss(client):
+    response = await client.get("/api/metrics")
+    for line in response.text.splitlines():
+        if line.startswith("mindmap_process_resident_memory_bytes "):
+            return int(float(line.split()[1]))
+    return None
+
+
+async def sample_rss(pid, client, samples, stop):
+    while not stop.is_set():
+        rss = tree_rss(pid) if pid else await metrics_rss(client)
+        if rss is not None:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), RSS_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_scenario(client, name, args, state, pid):
+    handler = HANDLERS[name]
+    for i in range(args.warmup):
+        await handler(client, -1 - i, state)
+
+    latencies = []
+    statuses = {}
+    counter = iter(range(args.requests))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await handler(client, i, state)
+                status = str(response.status_code)
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    rss = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(pid, client, rss, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    ordered = sorted(latencies)
+    ok = sum(count for status, count in statuses.items() if status.startswith("2") or status == "304")
+    return {
+        "requests": len(latencies),
+        "errors": len(latencies) - ok,
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99": round(percentile(ordered, 0.99) * 1000, 2),
+            "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+            "max": round(ordered[-1] * 1000, 2),
+        },
+        "rss_mb": {
+            "peak": round(max(rss) / 2**20, 1) if rss else None,
+            "end": round(rss[-1] / 2**20, 1) if rss else None,
+        },
+    }
+
+
+async def bench(args, base_url, pid):
+    limits = httpx.Limits(max_connections=args.concurrency + 2, max_keepalive_connections=args.concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client)
+        # Generate the graph once so expand has a node to start from.
+        seed = (await client.get("/api/graph", params={"q": QUERY})).json()
+        state = {
+            "link": next((node["link"] for node in seed["nodes"] if node.get("link")), ""),
+            "layout_nodes": args.layout_nodes,
+            "run": int(time.time()),
+        }
+        results = {}
+        for name in args.scenarios:
+            results[name] = await run_scenario(client, name, args, state, pid)
+            report(name, results[name])
+        return results
+
+
+def report(name, result):
+    latency = result["latency_ms"]
+    rss = result["rss_mb"]["peak"]
+    print(
+        f"{name:<12} {result['throughput_rps']:9.1f} req/s  p50 {latency['p50']:8.2f} ms  "
+        f"p95 {latency['p95']:8.2f} ms  p99 {latency['p99']:8.2f} ms  "
+        f"errors {result['errors']:<4} peak RSS {rss if rss is not None else '-'} MiB"
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, config, baseline_path, threshold):
+    # Prints the change against a baseline run and returns the scenarios that
+    # regressed: p95 up, or throughput down, by more than threshold.
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressed = []
+    print(f"\ncompared with {baseline_path}")
+    if baseline.get("config") != config:
+        print(f"note: baseline ran with {baseline.get('config')}")
+    baseline = baseline["scenarios"]
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        p95 = result["latency_ms"]["p95"] / max(before["latency_ms"]["p95"], 1e-9) - 1
+        rps = result["throughput_rps"] / max(before["throughput_rps"], 1e-9) - 1
+        flag = p95 > threshold or rps < -threshold
+        if flag:
+            regressed.append(name)
+        print(f"{name:<12} p95 {p95:+7.1%}  throughput {rps:+7.1%}{'  REGRESSION' if flag else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(DEFAULT_SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--layout-nodes", type=int, default=30)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--workers", type=int, help="MINDMAP_WORKERS for the local server")
+    parser.add_argument("--port", type=int, default=8721)
+    parser.add_argument("--url", help="benchmark a running server instead of starting one")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    started = datetime.now(timezone.utc)
+    if args.url:
+        results = asyncio.run(bench(args, args.url, None))
+    else:
+        # A fresh cache directory, so every run starts from the same state.
+        with tempfile.TemporaryDirectory() as cache_dir:
+            server = start_server(args.port, args.workers, cache_dir)
+            try:
+                results = asyncio.run(bench(args, f"http://127.0.0.1:{args.port}", server.pid))
+            finally:
+                server.terminate()
+                server.wait()
+
+    output = args.output or os.path.join(RESULTS_DIR, started.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    config = {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "layout_nodes": args.layout_nodes,
+        "workers": args.workers,
+    }
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "started": started.isoformat(),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "target": args.url or "local",
+                "config": config,
+                "scenarios": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"\nresults written to {output}")
+
+    if args.compare and compare(results, config, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
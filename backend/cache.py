@@ -0,0 +1,290 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+from fastapi.concurrency import run_in_threadpool
+
+CACHE_DIR = os.environ.get("MINDMAP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+MEMORY_MAX_BYTES = 32 * 1024 * 1024
+MEMORY_MAX_ENTRIES = 1024
+DISK_MAX_BYTES = 512 * 1024 * 1024
+DISK_TTL = 7 * 24 * 60 * 60
+# Rows deleted per statement when the disk store is over its size bound.
+EVICT_BATCH = 64
+
+
+def normalize_query(query):
+    # "  Pokémon " and "pokémon" should share a cache entry.
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def encode_value(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_value(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class MemoryLRU:
+    # Holds encoded values so the bound is on real bytes, not on entry count
+    # alone. Each value carries the time it expires at; an expired entry is a
+    # miss and is dropped when looked up. Values are bytes unless set() is
+    # given their size.
+
+    def __init__(self, max_bytes=MEMORY_MAX_BYTES, max_entries=MEMORY_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.bytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._live(key) is not None
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            self.pop(key)
+            return None
+        return entry
+
+    def get(self, key):
+        entry = self._live(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def expires_at(self, key):
+        entry = self._live(key)
+        return entry[1] if entry is not None else None
+
+    def set(self, key, value, expires_at, size=None):
+        self.pop(key)
+        size = len(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, expires_at, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes or len(self._entries) > self.max_entries:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+
+class DiskStore:
+    # SQLite-backed store with per-entry TTL and least-recently-used eviction
+    # once the total size goes over max_bytes. Triggers keep the total size in
+    # a one-row table, so a write only touches the index when it has to evict.
+    # Calls block, so async code goes through run_in_threadpool.
+
+    def __init__(self, path, max_bytes=DISK_MAX_BYTES, ttl=DISK_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS totals ("
+                " id INTEGER PRIMARY KEY CHECK (id = 0),"
+                " bytes INTEGER NOT NULL)"
+            )
+            # Seeds the total once for stores created before it was tracked.
+            conn.execute(
+                "INSERT OR IGNORE INTO totals (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM entries"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN"
+                " UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN"
+                " UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries BEGIN"
+                " UPDATE totals SET bytes = bytes - OLD.size + NEW.size WHERE id = 0; END"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key):
+        # (value, expires_at) for a live entry, or None.
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row
+
+    def set(self, key, blob):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete
+            # would not fire the size trigger.
+            conn.execute(
+                "INSERT INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET"
+                "  value = excluded.value, size = excluded.size,"
+                "  expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                (key, blob, len(blob), now + self.ttl, now),
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        while self._total(conn) > self.max_bytes:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (EVICT_BATCH,),
+            )
+
+    def _total(self, conn):
+        return conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            size = self._total(conn)
+        return {"entries": count, "bytes": size}
+
+
+class SingleFlight:
+    # Tracks in-progress generations so identical concurrent queries wait for
+    # the first one instead of starting their own.
+
+    def __init__(self):
+        self._flights = {}
+
+    def join(self, key):
+        return self._flights.get(key)
+
+    def lead(self, key):
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        return flight
+
+    def land(self, key, result):
+        # A None result tells waiters the leader gave up (failed or the client
+        # went away) and that they should retry.
+        flight = self._flights.pop(key, None)
+        if flight is not None and not flight.done():
+            flight.set_result(result)
+
+
+class SearchCache:
+    # Generated graphs per normalized query, in memory and on disk. Encoded
+    # /api/graph responses are also kept in memory, per query and variant,
+    # for as long as the graph they were made from.
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "search.sqlite3")):
+        self.memory = MemoryLRU()
+        self.responses = MemoryLRU()
+        self.disk = DiskStore(path)
+        self.flights = SingleFlight()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "response_hits": 0}
+
+    def is_hot(self, key):
+        # True if key can be answered from memory without any other work.
+        # Expired entries are not, so they go through admission control.
+        return key in self.memory
+
+    def version(self, key):
+        # Identifies the graph held in memory for key, or None if there is
+        # none: the expiry it was stored with, which a regenerated graph gets
+        # afresh and a reload from disk keeps.
+        return self.memory.expires_at(key)
+
+    def get_response(self, key, variant):
+        # A response stored by set_response, if it was made from the graph
+        # now held for key.
+        entry = self.responses.get((key, variant))
+        if entry is None or entry[0] != self.version(key):
+            return None
+        self.counters["response_hits"] += 1
+        return entry[1]
+
+    def set_response(self, key, variant, version, response, size):
+        if version is not None:
+            self.responses.set((key, variant), (version, response), version, size)
+
+    async def get(self, key):
+        blob = self.memory.get(key)
+        if blob is not None:
+            self.counters["memory_hits"] += 1
+            return decode_value(blob)
+
+        entry = await run_in_threadpool(self.disk.get_entry, key)
+        if entry is not None:
+            blob, expires_at = entry
+            self.counters["disk_hits"] += 1
+            # Kept in memory only until the disk entry expires.
+            self.memory.set(key, blob, expires_at)
+            return decode_value(blob)
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key, value):
+        blob = encode_value(value)
+        self.memory.set(key, blob, time.time() + self.disk.ttl)
+        await run_in_threadpool(self.disk.set, key, blob)
+
+    async def stats(self):
+        disk = await run_in_threadpool(self.disk.stats)
+        return {
+            **self.counters,
+            "memory": {"entries": len(self.memory), "bytes": self.memory.bytes},
+            "responses": {"entries": len(self.responses), "bytes": self.responses.bytes},
+            "disk": disk,
+        }
+
+
+search_cache = SearchCache()
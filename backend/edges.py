@@ -0,0 +1,185 @@
+import re
+import unicodedata
+
+import numpy as np
+from scipy import sparse
+
+TOP_K = 4
+MIN_SIMILARITY = 0.12
+MAX_DEGREE = 6
+# Rows per similarity product; bounds the dense (batch x nodes) scratch block.
+BATCH_SIZE = 1024
+# Terms found in more than this many nodes (and this share of them) are
+# dropped: they carry almost no idf weight but make the similarity product
+# close to dense.
+COMMON_TERM_MIN = 50
+COMMON_TERM_RATIO = 0.02
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+STOP_WORDS = frozenset("""
+a about across after all also an and any are as at be been but by can covering
+every for from guide how in into introduction is it its like more of on or
+other over the their them they this through to understanding up using what
+when which with your you
+""".split())
+
+
+def tokenize(text):
+    # Accent-folded, casefolded word tokens, so "Pokémon" matches "pokemon".
+    folded = text.casefold()
+    if not folded.isascii():
+        folded = unicodedata.normalize("NFKD", folded)
+        folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return [token for token in TOKEN_RE.findall(folded) if len(token) > 1 and token not in STOP_WORDS]
+
+
+def node_text(node):
+    # The title is repeated so it outweighs the longer overview.
+    return f"{node.get('title', '')} {node.get('title', '')} {node.get('overview', '')}"
+
+
+class EdgeIndex:
+    # Infers edges between nodes from the cosine similarity of their TF-IDF
+    # vectors. Each node links to at most top_k neighbours above
+    # min_similarity, and no node ends up with more than max_degree edges.
+    #
+    # Nodes can be added in batches: only the new rows are vectorized and
+    # scored. Existing rows keep the IDF weights they were built with. Rows
+    # are stored in blocks, each with its transpose cached; a new block is
+    # merged into the one before it while that one is no more than twice its
+    # size, so there are O(log n) blocks and every row is re-stacked O(log n)
+    # times in total.
+
+    def __init__(self, top_k=TOP_K, min_similarity=MIN_SIMILARITY, max_degree=MAX_DEGREE):
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self.max_degree = max_degree
+        self.titles = []
+        self.vocabulary = {}
+        self.doc_freq = np.zeros(0, dtype=np.int64)
+        # (first row, rows, rows transposed) per block.
+        self.blocks = []
+        self.degree = []
+        self.pairs = set()
+
+    def __len__(self):
+        return len(self.titles)
+
+    def add(self, nodes):
+        # Indexes the nodes and returns the edges they introduced, as
+        # {"source", "target"} dicts.
+        if not nodes:
+            return []
+        start = len(self.titles)
+        counts = self._count_terms([tokenize(node_text(node)) for node in nodes])
+        self.titles.extend(node["title"] for node in nodes)
+        self.degree.extend([0] * len(nodes))
+        weights = self._weigh(counts)
+        self._append_block(start, weights)
+        return self._link(start, weights)
+
+    def _append_block(self, start, weights):
+        self.blocks.append((start, weights, weights.T.tocsr()))
+        while len(self.blocks) > 1 and self.blocks[-2][1].shape[0] <= 2 * self.blocks[-1][1].shape[0]:
+            _, lower, _ = self.blocks.pop()
+            first, upper, _ = self.blocks[-1]
+            # Earlier blocks predate the newest terms; widen them to match.
+            upper.resize((upper.shape[0], lower.shape[1]))
+            merged = sparse.vstack((upper, lower), format="csr")
+            self.blocks[-1] = (first, merged, merged.T.tocsr())
+
+    def _count_terms(self, terms):
+        rows = []
+        cols = []
+        vocabulary = self.vocabulary
+        for row, tokens in enumerate(terms):
+            ids = [vocabulary.setdefault(token, len(vocabulary)) for token in tokens]
+            rows.extend([row] * len(ids))
+            cols.extend(ids)
+
+        shape = (len(terms), len(self.vocabulary))
+        counts = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape
+        )
+        counts.sum_duplicates()
+
+        doc_freq = np.bincount(counts.indices, minlength=shape[1])
+        doc_freq[: len(self.doc_freq)] += self.doc_freq
+        self.doc_freq = doc_freq
+        return counts
+
+    def _weigh(self, counts):
+        # Sublinear tf, smoothed idf, rows scaled to unit length so a dot
+        # product is the cosine similarity.
+        # Works on the CSR arrays directly; this runs once per added batch and
+        # sparse-matrix operations carry a large fixed cost.
+        n = len(self.titles)
+        idf = (np.log((1 + n) / (1 + self.doc_freq)) + 1).astype(np.float32)
+        idf[self.doc_freq > max(COMMON_TERM_MIN, COMMON_TERM_RATIO * n)] = 0
+        weights = counts.copy()
+        weights.data = ((1 + np.log(weights.data)) * idf[weights.indices]).astype(np.float32)
+        weights.eliminate_zeros()
+        lengths = np.diff(weights.indptr)
+        squares = np.zeros(len(lengths), dtype=np.float32)
+        filled = lengths > 0
+        squares[filled] = np.add.reduceat(weights.data ** 2, weights.indptr[:-1][filled])
+        weights.data /= np.repeat(np.sqrt(np.maximum(squares, 1e-24)), lengths)
+        return weights
+
+    def _candidates(self, start, weights):
+        # Top-k neighbours of every new row (start onwards), as (i, j, sim).
+        n = len(self.titles)
+        k = min(self.top_k, n - 1)
+        if k <= 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.float32)
+
+        sources = []
+        targets = []
+        scores = []
+        for lo in range(0, weights.shape[0], BATCH_SIZE):
+            part = weights[lo:lo + BATCH_SIZE]
+            row_ids = np.arange(start + lo, start + lo + part.shape[0])
+            rows = []
+            cols = []
+            sims = []
+            for first, _, transposed in self.blocks:
+                block = (part[:, :transposed.shape[0]] @ transposed).tocsr()
+                rows.append(np.repeat(row_ids, np.diff(block.indptr)))
+                cols.append(block.indices + first)
+                sims.append(block.data)
+            rows = np.concatenate(rows)
+            cols = np.concatenate(cols)
+            sims = np.concatenate(sims)
+            keep = (sims >= self.min_similarity) & (cols != rows)
+            rows, cols, sims = rows[keep], cols[keep], sims[keep]
+
+            # Rank entries within each row by similarity and keep the first k.
+            order = np.lexsort((-sims, rows))
+            rows, cols, sims = rows[order], cols[order], sims[order]
+            rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+            keep = rank < k
+            sources.append(rows[keep])
+            targets.append(cols[keep])
+            scores.append(sims[keep])
+        return np.concatenate(sources), np.concatenate(targets), np.concatenate(scores)
+
+    def _link(self, start, weights):
+        sources, targets, scores = self._candidates(start, weights)
+        low = np.minimum(sources, targets)
+        high = np.maximum(sources, targets)
+
+        # Strongest pairs claim degree first; each unordered pair is
+        # considered once.
+        order = np.lexsort((high, low, -scores))
+        added = []
+        degree = self.degree
+        for i, j in zip(low[order].tolist(), high[order].tolist()):
+            if degree[i] >= self.max_degree or degree[j] >= self.max_degree or (i, j) in self.pairs:
+                continue
+            self.pairs.add((i, j))
+            degree[i] += 1
+            degree[j] += 1
+            added.append({"source": self.titles[i], "target": self.titles[j]})
+        return added
@@ -0,0 +1,266 @@
+import asyncio
+import codecs
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from cache import CACHE_DIR, DiskStore, decode_value, encode_value
+from instrument import span
+
+MAX_CONNECTIONS = 64
+PER_HOST_CONNECTIONS = 4
+TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+# Extraction stops reading a page once this much body text has been seen.
+MAX_TEXT_CHARS = 4000
+# Bytes handed to the parser at a time; small enough that reading stops soon
+# after MAX_TEXT_CHARS is reached.
+CHUNK_SIZE = 8192
+MAX_OVERVIEW_CHARS = 200
+PAGE_CACHE_TTL = 30 * 24 * 60 * 60
+USER_AGENT = "mindmap/0.1 (+https://github.com/byung806/mindmap)"
+
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "nav", "footer"}
+BLOCK_TAGS = {"p", "div", "li", "br", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "tr"}
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+class TextExtractor(HTMLParser):
+    # Incremental HTML-to-text: feed() it chunks as they arrive and check
+    # done to stop downloading once enough text has been collected.
+
+    def __init__(self, max_chars=MAX_TEXT_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.title = ""
+        self.description = ""
+        self._chunks = []
+        self._chars = 0
+        self._skip_depth = 0
+        self._in_title = False
+        self._in_body = False
+
+    @property
+    def done(self):
+        return self._chars >= self.max_chars
+
+    @property
+    def text(self):
+        return WHITESPACE_RE.sub(" ", "".join(self._chunks)).strip()[: self.max_chars]
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "body":
+            self._in_body = True
+        elif tag == "meta":
+            attrs = dict(attrs)
+            name = (attrs.get("name") or attrs.get("property") or "").lower()
+            if name in ("description", "og:description") and not self.description:
+                self.description = (attrs.get("content") or "").strip()
+        elif tag in BLOCK_TAGS:
+            self._chunks.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in BLOCK_TAGS:
+            self._chunks.append(" ")
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._in_title:
+            self.title += data
+        elif self._in_body and not self.done:
+            self._chunks.append(data)
+            self._chars += len(data)
+
+
+def summarize(text, limit=MAX_OVERVIEW_CHARS):
+    # First sentence(s) of the page text that fit in limit characters.
+    text = WHITESPACE_RE.sub(" ", text).strip()
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(". ", 0, limit)
+    if cut > limit // 3:
+        return text[: cut + 1]
+    return text[: limit].rsplit(" ", 1)[0] + "…"
+
+
+class LinkFetcher:
+    # Fetches pages over one shared connection pool, with a global and a
+    # per-host concurrency limit. Extracted text is kept in a local content
+    # cache keyed by URL and revalidated with ETag / Last-Modified, so an
+    # unchanged page costs a 304 and no parsing.
+
+    def __init__(
+        self,
+        store=None,
+        max_connections=MAX_CONNECTIONS,
+        per_host=PER_HOST_CONNECTIONS,
+        timeout=TIMEOUT,
+        max_chars=MAX_TEXT_CHARS,
+    ):
+        self.store = store or DiskStore(os.path.join(CACHE_DIR, "pages.sqlite3"), ttl=PAGE_CACHE_TTL)
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_chars = max_chars
+        self._client = None
+        self._slots = None
+        self._host_slots = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"},
+            )
+            self._slots = asyncio.Semaphore(self.max_connections)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc.lower()
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        return slot
+
+    async def fetch(self, url):
+        # Returns {"url", "status", "title", "description", "text", "cached"}
+        # plus "error" when the page could not be fetched. Never raises for a
+        # bad page, so one URL cannot abort a whole batch.
+        try:
+            return await self._fetch(url)
+        except Exception as exc:
+            return {"url": url, "status": None, "error": str(exc) or type(exc).__name__}
+
+    async def _fetch(self, url):
+        client = self.client
+        blob = await run_in_threadpool(self.store.get, url)
+        cached = decode_value(blob) if blob is not None else None
+
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        try:
+            async with self._host_slot(url), self._slots:
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached is not None:
+                        return {**cached["page"], "status": 304, "cached": True}
+                    if response.status_code >= 400:
+                        return {"url": url, "status": response.status_code, "error": response.reason_phrase}
+                    page = await self._extract(url, response)
+        except httpx.HTTPError as exc:
+            return {"url": url, "status": None, "error": str(exc) or type(exc).__name__}
+
+        entry = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "page": page,
+        }
+        if entry["etag"] or entry["last_modified"]:
+            await run_in_threadpool(self.store.set, url, encode_value(entry))
+        return {**page, "status": response.status_code, "cached": False}
+
+    async def _extract(self, url, response):
+        parser = TextExtractor(self.max_chars)
+        decoder = incremental_decoder(response.charset_encoding)
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            parser.feed(decoder.decode(chunk))
+            if parser.done:
+                break
+        else:
+            parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+        return {
+            "url": url,
+            "title": WHITESPACE_RE.sub(" ", parser.title).strip(),
+            "description": parser.description,
+            "text": parser.text,
+        }
+
+    async def fetch_all(self, urls):
+        # Yields results in completion order, not input order. Closing the
+        # generator early cancels whatever is still in flight.
+        tasks = [asyncio.ensure_future(self.fetch(url)) for url in dict.fromkeys(urls)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                async with span("fetch"):
+                    page = await next_done
+                yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def incremental_decoder(charset):
+    # Pages can name charsets Python does not know; decode those as utf-8.
+    try:
+        factory = codecs.getincrementaldecoder(charset or "utf-8")
+    except LookupError:
+        factory = codecs.getincrementaldecoder("utf-8")
+    return factory(errors="replace")
+
+
+link_fetcher = LinkFetcher()
+
+
+async def enrich_nodes(nodes, fetcher=None):
+    # Yields nodes with their title/overview filled in from the linked page.
+    # Nodes that already have both pass straight through; the rest are
+    # fetched concurrently and yielded as their pages finish.
+    fetcher = fetcher or link_fetcher
+    pending = {}
+    for node in nodes:
+        if node.get("title") and node.get("overview"):
+            yield node
+        elif node.get("link"):
+            pending.setdefault(node["link"], []).append(node)
+        else:
+            # Nothing to fetch; pass it through as it is.
+            yield node
+
+    if not pending:
+        return
+
+    async for page in fetcher.fetch_all(pending):
+        for node in pending[page["url"]]:
+            if not page.get("error"):
+                node = {
+                    **node,
+                    "title": node.get("title") or page["title"] or page["url"],
+                    "overview": node.get("overview") or page["description"] or summarize(page["text"]),
+                }
+            elif not node.get("title"):
+                node = {**node, "title": page["url"]}
+            yield node
@@ -0,0 +1,310 @@
+import asyncio
+import json
+import time
+
+from analytics import apply_annotations, graph_annotations
+from cache import normalize_query, search_cache
+from edges import EdgeIndex
+from fetch import enrich_nodes
+from instrument import run_measured, span
+from nuclear import cached_layout, graph_hash, layout_positions, store_layout
+from store import graph_store
+from workers import compute_pool
+
+# Edges are inferred for up to this many new nodes at once, or for whatever
+# arrived within EDGE_BATCH_SECONDS of the oldest node still waiting.
+EDGE_BATCH = 64
+EDGE_BATCH_SECONDS = 0.05
+
+# Placeholder content until real graph generation lands; the same resources
+# the search page renders today.
+SAMPLE_NODES = [
+    {
+        "link": "https://diamondpearl.pokemon.com/en-us/trainersguide/fundamentals/",
+        "title": "Pokémon Trainer Fundamentals",
+        "overview": "Official walkthrough of catching, raising, and battling Pokémon in the core games.",
+        "topic": "Fundamentals",
+    },
+    {
+        "link": "https://www.dragonflycave.com/mechanics",
+        "title": "Game Mechanics Deep Dive",
+        "overview": "In-depth explanations of stat calculations, battle modifiers, and capture algorithms.",
+        "topic": "Mechanics",
+    },
+    {
+        "link": "https://www.instructables.com/How-to-Build-a-Competitive-Pokemon-Team-a-Comprehe/",
+        "title": "Competitive Team Building Guide",
+        "overview": "Step-by-step guide for team-building in competitive formats, covering IVs, EVs, and tiers.",
+        "topic": "Competitive",
+    },
+    {
+        "link": "https://www.smogon.com/dp/articles/intro_comp_pokemon",
+        "title": "Introduction to Competitive Play",
+        "overview": "Overview of competitive Pokémon play emphasizing mechanics, team organization, and tactics.",
+        "topic": "Competitive",
+    },
+    {
+        "link": "https://www.vgcguide.com/",
+        "title": "VGC Strategy Guide",
+        "overview": "Comprehensive resource for building competitive teams and understanding meta-game tactics.",
+        "topic": "Competitive",
+    },
+    {
+        "link": "https://scarletviolet.pokemon.com/en-us/trainers-guide/the-terastal-phenomenon/",
+        "title": "Terastal Phenomenon Guide",
+        "overview": "Official explanation of the Tera-type mechanic and how it changes battle strategy.",
+        "topic": "Advanced Mechanics",
+    },
+    {
+        "link": "https://en.wikipedia.org/wiki/Pok%C3%A9mon_Showdown",
+        "title": "Pokémon Showdown Simulator",
+        "overview": "Browser-based simulator for competitive Pokémon that lets you build teams and test strategies.",
+        "topic": "Tools",
+    },
+    {
+        "link": "https://www.pokemon.com/us/play-pokemon/about/tournaments-rules-and-resources",
+        "title": "Official Tournament Rules",
+        "overview": "Official tournament rules and resources for Pokémon video game competition.",
+        "topic": "Competitive",
+    },
+    {
+        "link": "https://www.pokemon.com/us/pokedex/",
+        "title": "Pokédex Database",
+        "overview": "Official database of every Pokémon species, forms, moves and abilities.",
+        "topic": "Fundamentals",
+    },
+    {
+        "link": "https://bulbapedia.bulbagarden.net/wiki/Move_(Pok%C3%A9mon)",
+        "title": "Moves and Abilities Guide",
+        "overview": "Deep guide to Pokémon moves, abilities, categories, effects, and mechanics.",
+        "topic": "Mechanics",
+    },
+    {
+        "link": "https://bulbapedia.bulbagarden.net/wiki/Type",
+        "title": "Type Effectiveness Chart",
+        "overview": "Comprehensive chart of Pokémon types and their effectiveness relationships.",
+        "topic": "Mechanics",
+    },
+    {
+        "link": "https://bulbapedia.bulbagarden.net/wiki/Breeding",
+        "title": "Breeding Mechanics",
+        "overview": "Deep dive into breeding, egg groups, inheritance of IVs/abilities and chain breeding.",
+        "topic": "Mechanics",
+    },
+    {
+        "link": "https://bulbapedia.bulbagarden.net/wiki/Nature",
+        "title": "Natures and Stats",
+        "overview": "Guide to hidden values (IVs), effort values (EVs), and natures in competitive play.",
+        "topic": "Mechanics",
+    },
+    {
+        "link": "https://www.smogon.com/dp/articles/teambuilding101",
+        "title": "Team Building 101",
+        "overview": "Introduction to building functional competitive teams with synergy and role coverage.",
+        "topic": "Competitive",
+    },
+    {
+        "link": "https://www.smogon.com/dp/articles/metagame/",
+        "title": "Metagame and Tiering",
+        "overview": "Guide to how tiers, bans, formats and metagame evolution shape competitive play.",
+        "topic": "Competitive",
+    },
+    {
+        "link": "https://www.pokemon.com/us/pokemon-tcg",
+        "title": "Pokémon Trading Card Game",
+        "overview": "Official tutorial covering the basics of the Pokémon Trading Card Game rules.",
+        "topic": "Alternate Format",
+    },
+    {
+        "link": "https://www.pokemon.com/us/pokemon-go",
+        "title": "Pokémon GO",
+        "overview": "Introduction to AR-based Pokémon gameplay and mobile gaming experience.",
+        "topic": "Alternate Format",
+    },
+    {
+        "link": "https://bulbapedia.bulbagarden.net/wiki/Evolution",
+        "title": "Evolution Methods",
+        "overview": "Detailed explanation of how Pokémon evolve through levels, items, friendship, and trading.",
+        "topic": "Fundamentals",
+    },
+]
+
+
+async def link_batch(index, nodes):
+    # Edges introduced by nodes, inferred on a thread. The index is
+    # per-generation state that would have to be pickled to a worker for
+    # every batch, and a batch is small enough that shipping its nodes to a
+    # worker to tokenize costs more than tokenizing them here.
+    if not nodes:
+        return []
+    async with span("edges"):
+        return await run_measured(index.add, nodes)
+
+
+async def generate_graph(query):
+    # Yields ("node", node) and ("edge", edge) events as the graph is built.
+    # Edges are inferred from text similarity for batches of arrived nodes
+    # and only ever join nodes that were already emitted, so a client can
+    # render every event the moment it arrives. A batch is linked once it is
+    # full or once its oldest node has waited EDGE_BATCH_SECONDS, whether or
+    # not another node has arrived by then.
+    index = EdgeIndex()
+    pending = []
+    deadline = None
+    nodes = enrich_nodes(SAMPLE_NODES)
+    upcoming = asyncio.ensure_future(nodes.__anext__())
+    try:
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            # asyncio.wait rather than wait_for: a timeout must not cancel the
+            # fetch for the next node.
+            done, _ = await asyncio.wait((upcoming,), timeout=timeout)
+            if done:
+                try:
+                    node = dict(upcoming.result())
+                except StopAsyncIteration:
+                    break
+                upcoming = asyncio.ensure_future(nodes.__anext__())
+                yield "node", node
+                pending.append(node)
+                deadline = deadline or time.monotonic() + EDGE_BATCH_SECONDS
+                if len(pending) < EDGE_BATCH and time.monotonic() < deadline:
+                    continue
+
+            for edge in await link_batch(index, pending):
+                yield "edge", edge
+            pending = []
+            deadline = None
+    finally:
+        upcoming.cancel()
+
+    for edge in await link_batch(index, pending):
+        yield "edge", edge
+
+
+def replay_graph(graph):
+    # The events of the generation that produced graph, node frames included
+    # as they were before analytics.
+    for node in graph["nodes"]:
+        yield "node", node
+    for edge in graph["edges"]:
+        yield "edge", edge
+    yield "analytics", graph["analytics"]
+
+
+def annotated_nodes(nodes, annotations):
+    # Copies of nodes with their analytics size and topic, leaving the node
+    # frames as they were sent.
+    nodes = [dict(node) for node in nodes]
+    apply_annotations(nodes, annotations)
+    return nodes
+
+
+async def graph_layout(nodes, edges, client=None, admit=True):
+    # Positions for a graph, computed on the compute pool and cached in this
+    # process per graph hash.
+    async with span("layout"):
+        key = graph_hash(nodes, edges)
+        layout = cached_layout(key)
+        if layout is None:
+            layout = await compute_pool.submit(client, layout_positions, nodes, edges, admit=admit)
+            store_layout(key, layout)
+    return layout
+
+
+async def search_graph(query, client=None):
+    # Same events as generate_graph, followed by an ("analytics", ...) event
+    # with the size and canonical topic computed for every node. Served from
+    # the query cache when possible. Concurrent misses for one query share a
+    # single generation: the first request leads and streams live, the rest
+    # wait for its result.
+    key = normalize_query(query)
+    while True:
+        async with span("cache"):
+            graph = await search_cache.get(key)
+        if graph is not None and "analytics" not in graph:
+            # Cached before annotations were kept apart from the node frames;
+            # generate it again.
+            graph = None
+        if graph is None:
+            flight = search_cache.flights.join(key)
+            if flight is not None:
+                search_cache.counters["coalesced"] += 1
+                graph = await asyncio.shield(flight)
+                if graph is None:
+                    # The leader failed or was abandoned; try again.
+                    continue
+
+        if graph is not None:
+            for event in replay_graph(graph):
+                yield event
+            return
+
+        search_cache.flights.lead(key)
+        graph = None
+        try:
+            nodes = []
+            edges = []
+            async for kind, data in generate_graph(query):
+                (nodes if kind == "node" else edges).append(data)
+                yield kind, data
+            # The cached graph keeps the node frames as sent and the
+            # annotations beside them, so a replay sends the same events. The
+            # request was admitted before it started streaming, so this job
+            # skips the queue limits.
+            async with span("analytics"):
+                annotations = await compute_pool.submit(client, graph_annotations, nodes, edges, admit=False)
+            yield "analytics", annotations
+            graph = {"nodes": nodes, "edges": edges, "analytics": annotations}
+            async with span("store"):
+                await search_cache.set(key, graph)
+                await run_measured(graph_store.add_graph, annotated_nodes(nodes, annotations), edges)
+        finally:
+            search_cache.flights.land(key, graph)
+        return
+
+
+async def build_graph(query, client=None):
+    # The whole graph as one {"nodes", "edges"} dict, for non-streaming
+    # endpoints, with each node's analytics size and topic applied.
+    graph = {"nodes": [], "edges": []}
+    async for kind, data in search_graph(query, client):
+        if kind in ("node", "edge"):
+            graph[kind + "s"].append(data)
+        elif kind == "analytics":
+            graph["nodes"] = annotated_nodes(graph["nodes"], data)
+    return graph
+
+
+def encode_frame(frame):
+    return (json.dumps(frame, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def stream_graph(query, layout=False, client=None):
+    # NDJSON body for /api/search: one frame per node or edge, an "analytics"
+    # frame with node sizes and topics, then a final "complete" frame. Only
+    # counts are kept unless a layout was requested, in which case a "layout"
+    # frame with x/y per node precedes "complete".
+    nodes = []
+    edges = []
+    node_count = 0
+    edge_count = 0
+    async for kind, data in search_graph(query, client):
+        if kind == "node":
+            node_count += 1
+            if layout:
+                nodes.append(data)
+        elif kind == "edge":
+            edge_count += 1
+            if layout:
+                edges.append(data)
+        elif kind == "analytics" and layout:
+            # Lay out at the sizes the client draws once it applies them.
+            nodes = annotated_nodes(nodes, data)
+        yield encode_frame({"type": kind, "data": data})
+
+    if layout:
+        positions = await graph_layout(nodes, edges, client, admit=False)
+        yield encode_frame({"type": "layout", "data": positions})
+
+    yield encode_frame({"type": "complete", "nodes": node_count, "edges": edge_count})
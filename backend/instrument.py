@@ -0,0 +1,356 @@
+import bisect
+import cProfile
+import io
+import os
+import pstats
+import resource
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    import pyinstrument
+except ImportError:  # optional: cProfile is used when pyinstrument is unavailable
+    pyinstrument = None
+
+# Per-request profiling is off unless the server is started with this set,
+# since a profile exposes code paths and slows the request down.
+PROFILING = os.environ.get("MINDMAP_PROFILING", "") not in ("", "0")
+PROFILE_HEADER = "x-profile"
+MAX_PROFILES = 32
+PROFILE_INTERVAL = 0.001
+PROFILE_LINES = 40
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(10))
+
+PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    # Cumulative-bucket histogram per label value, in the shape Prometheus
+    # expects.
+
+    def __init__(self, name, help, label, buckets):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, value, labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            base = ",".join(f'{key}="{escape(value)}"' for key, value in zip(self.label, labels))
+            running = 0
+            for bound, bucket in zip(self.buckets, counts):
+                running += bucket
+                lines.append(f'{self.name}_bucket{{{base},le="{number(bound)}"}} {running}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{base}}} {number(total)}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+
+stage_wall = Histogram(
+    "mindmap_stage_wall_seconds", "Wall time per request spent in each stage.", ("stage",), SECONDS_BUCKETS
+)
+stage_cpu = Histogram(
+    "mindmap_stage_cpu_seconds",
+    "CPU time per request spent in each stage, including work offloaded to threads and worker processes.",
+    ("stage",),
+    SECONDS_BUCKETS,
+)
+stage_alloc = Histogram(
+    "mindmap_stage_alloc_bytes",
+    "Net bytes allocated per request in each synchronous stage (only when tracemalloc is tracing).",
+    ("stage",),
+    BYTES_BUCKETS,
+)
+request_duration = Histogram(
+    "mindmap_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ("route", "method", "status"),
+    SECONDS_BUCKETS,
+)
+
+
+def number(value):
+    return str(value) if isinstance(value, int) else f"{value:.9g}"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def allocated():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+class Timings:
+    # Stage totals for one request. Spans add to it as they close; offloaded
+    # work adds its CPU time to the innermost open span.
+
+    def __init__(self):
+        self.stages = {}
+        self.open = []
+
+    def add(self, name, wall, cpu, alloc):
+        totals = self.stages.setdefault(name, [0.0, 0.0, None])
+        totals[0] += wall
+        totals[1] += cpu
+        if alloc is not None:
+            totals[2] = (totals[2] or 0) + alloc
+
+    def observe(self):
+        for name, (wall, cpu, alloc) in self.stages.items():
+            record_stage(name, wall, cpu, alloc)
+
+    def server_timing(self, total):
+        parts = [
+            f'{name};dur={wall * 1000:.1f};desc="cpu {cpu * 1000:.1f}ms"'
+            for name, (wall, cpu, _) in self.stages.items()
+        ]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_timings = ContextVar("mindmap_timings", default=None)
+
+
+def record_stage(name, wall, cpu, alloc):
+    stage_wall.observe(wall, (name,))
+    stage_cpu.observe(cpu, (name,))
+    if alloc is not None and tracemalloc.is_tracing():
+        stage_alloc.observe(max(alloc, 0), (name,))
+
+
+class span:
+    # Times a stage of the current request. Synchronous code uses
+    #
+    #     with span("serialize"):
+    #         ...
+    #
+    # and its CPU time is that of the calling thread. Code that awaits uses
+    #
+    #     async with span("layout"):
+    #         ...
+    #
+    # and its CPU time is only what offloaded work reports through add_cpu,
+    # since the event loop runs other requests while the span waits; for the
+    # same reason it records no allocations. Spans with the same name in one
+    # request are summed. Outside a request each span is recorded on its own.
+
+    __slots__ = ("name", "cpu", "_timings", "_wall", "_thread_cpu", "_alloc")
+
+    def __init__(self, name):
+        self.name = name
+        self.cpu = 0.0
+
+    def __enter__(self):
+        self._timings = _timings.get()
+        if self._timings is not None:
+            self._timings.open.append(self)
+        self._alloc = allocated()
+        self._thread_cpu = time.thread_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._close(self.cpu + time.thread_time() - self._thread_cpu, allocated() - self._alloc)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        self._close(self.cpu, None)
+        return False
+
+    def _close(self, cpu, alloc):
+        wall = time.perf_counter() - self._wall
+        if self._timings is None:
+            record_stage(self.name, wall, cpu, alloc)
+        else:
+            if self in self._timings.open:
+                self._timings.open.remove(self)
+            self._timings.add(self.name, wall, cpu, alloc)
+
+
+def add_cpu(seconds):
+    timings = _timings.get()
+    if timings is not None and timings.open:
+        timings.open[-1].cpu += seconds
+
+
+def measured(fn, *args):
+    # Runs fn(*args) and returns (result, CPU seconds used by this thread).
+    # Module-level, so it can be sent to worker processes.
+    start = time.thread_time()
+    result = fn(*args)
+    return result, time.thread_time() - start
+
+
+async def run_measured(fn, *args):
+    # run_in_threadpool, with the CPU time the call used charged to the open
+    # span.
+    result, cpu = await run_in_threadpool(measured, fn, *args)
+    add_cpu(cpu)
+    return result
+
+
+class Profile:
+    # A profile of one request: pyinstrument's sampling profiler when it is
+    # installed, otherwise cProfile. cProfile sees everything the event loop
+    # runs meanwhile, so it is best used on an otherwise idle server.
+
+    active = False
+
+    def __init__(self):
+        if pyinstrument is not None:
+            self._profiler = pyinstrument.Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+        else:
+            self._profiler = cProfile.Profile()
+
+    @classmethod
+    def begin(cls):
+        # One profiled request at a time; returns None if one is running.
+        if cls.active:
+            return None
+        profile = cls()
+        cls.active = True
+        try:
+            if pyinstrument is not None:
+                profile._profiler.start()
+            else:
+                profile._profiler.enable()
+        except (RuntimeError, ValueError):
+            cls.active = False
+            return None
+        return profile
+
+    def end(self):
+        if pyinstrument is not None:
+            self._profiler.stop()
+            text = self._profiler.output_text()
+        else:
+            self._profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            text = out.getvalue()
+        Profile.active = False
+        return text
+
+
+profiles = OrderedDict()
+
+
+def store_profile(profile_id, text):
+    profiles[profile_id] = text
+    if len(profiles) > MAX_PROFILES:
+        profiles.popitem(last=False)
+
+
+def wants_profile(scope):
+    if not PROFILING:
+        return False
+    for key, value in scope["headers"]:
+        if key == PROFILE_HEADER.encode() and value not in (b"", b"0"):
+            return True
+    return False
+
+
+class TimingMiddleware:
+    # Collects span timings per request, adds them to the response as a
+    # Server-Timing header and records them in the histograms once the
+    # response is finished. Streamed responses send their headers before
+    # most of their stages run, so for those the header only covers what ran
+    # first; the histograms cover everything. With MINDMAP_PROFILING set, a
+    # request carrying "X-Profile: 1" is profiled and the response names the
+    # profile in X-Profile-Id; it can be read from /api/profiles/{id}.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = Timings()
+        token = _timings.set(timings)
+        profile = Profile.begin() if wants_profile(scope) else None
+        profile_id = uuid.uuid4().hex[:12] if profile is not None else None
+        start = time.perf_counter()
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing(time.perf_counter() - start).encode()))
+                if profile_id is not None:
+                    headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            if profile is not None:
+                store_profile(profile_id, profile.end())
+            route = scope.get("route")
+            request_duration.observe(
+                time.perf_counter() - start,
+                (getattr(route, "path", "unmatched"), scope["method"], str(status)),
+            )
+            timings.observe()
+            _timings.reset(token)
+
+
+def resident_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # Peak rather than current RSS; kilobytes on Linux, bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def render_metrics(families=()):
+    # Prometheus text exposition of the histograms, process metrics and the
+    # given extra families, each (name, type, help, [(labels dict, value)]).
+    times = os.times()
+    families = [
+        ("mindmap_process_resident_memory_bytes", "gauge", "Resident set size of the server process.",
+         [({}, resident_bytes())]),
+        ("mindmap_process_cpu_seconds_total", "counter", "User and system CPU time of the server process.",
+         [({}, times.user + times.system)]),
+        *families,
+    ]
+    lines = []
+    for name, kind, help, samples in families:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            rendered = ",".join(f'{key}="{escape(label)}"' for key, label in labels.items())
+            lines.append(f"{name}{{{rendered}}} {number(value)}" if rendered else f"{name} {number(value)}")
+    for histogram in (request_duration, stage_wall, stage_cpu, stage_alloc):
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
@@ -1,12 +1,212 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+from cache import normalize_query, search_cache
+from fetch import link_fetcher
+from graph import build_graph, graph_layout, stream_graph
+from instrument import PROMETHEUS, TimingMiddleware, profiles, render_metrics, run_measured, span
+from store import MAX_EXPAND_DEPTH, graph_store
+from wire import choose_encoding, compress, content_etag, etag_matches, msgpack, preferred_encoding, serialize_graph
+from workers import ClientDisconnected, Overloaded, client_key, compute_pool, until_disconnected
+
+# Graphs with more nodes than this are serialized on a thread, and bodies
+# larger than this are compressed on one, so they do not hold up the event
+# loop.
+OFFLOAD_NODES = 1000
+OFFLOAD_BYTES = 256 * 1024
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await compute_pool.start()
+    yield
+    await compute_pool.stop()
+    await link_fetcher.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(TimingMiddleware)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded(request, exc):
+    return JSONResponse(
+        {"detail": "Server is busy, try again shortly"},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected(request, exc):
+    # Nobody is listening; 499 only shows up in access logs.
+    return Response(status_code=499)
+
+
+async def run_stage(name, offload, fn, *args):
+    # fn(*args) timed as a stage, on a thread if offload is set.
+    if offload:
+        async with span(name):
+            return await run_measured(fn, *args)
+    with span(name):
+        return fn(*args)
+
+
+def admit_search(request, query):
+    # Searches answered from memory need no compute; anything else may, so it
+    # has to get past admission control before a response starts.
+    if not search_cache.is_hot(normalize_query(query)):
+        compute_pool.check(client_key(request))
+
+
+class Node(BaseModel):
+    link: str = ""
+    title: str
+    overview: str = ""
+    topic: str = ""
+    size: Optional[int] = None
+
+
+class Edge(BaseModel):
+    source: str
+    target: str
+
+
+class Graph(BaseModel):
+    nodes: List[Node]
+    edges: List[Edge]
 
-app = FastAPI()
 
 @app.get("/api/greeting")
 async def get_greeting():
     return {"message": "Hello from FastAPI!"}
 
 
+@app.get("/api/search")
+async def search(request: Request, q: str = Query(..., min_length=1), layout: bool = False):
+    # Streams the graph as NDJSON so the mind map can start rendering before
+    # generation has finished.
+    if layout:
+        compute_pool.check(client_key(request))
+    else:
+        admit_search(request, q)
+    return StreamingResponse(
+        stream_graph(q, layout=layout, client=client_key(request)),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.get("/api/graph")
+async def get_graph(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    format: str = Query("json", pattern="^(json|compact|msgpack)$"),
+):
+    # The complete graph in one response. "compact" and "msgpack" send
+    # columnar nodes with index-pair edges; responses carry a content-hash
+    # ETag so a repeat view is answered with 304 and no body. Encoded
+    # responses are cached with the graph, so repeat requests skip building,
+    # serializing and compressing it.
+    if format == "msgpack" and msgpack is None:
+        raise HTTPException(status_code=406, detail="msgpack is not installed on this server")
+
+    admit_search(request, q)
+    key = normalize_query(q)
+    accept_encoding = request.headers.get("accept-encoding")
+    variant = (format, preferred_encoding(accept_encoding))
+    response = search_cache.get_response(key, variant)
+    if response is None:
+        graph = await until_disconnected(request, build_graph(q, client_key(request)))
+        version = search_cache.version(key)
+        body, media_type = await run_stage(
+            "serialize", len(graph["nodes"]) > OFFLOAD_NODES, serialize_graph, graph, format
+        )
+        encoding = choose_encoding(accept_encoding, len(body))
+        etag = content_etag(body, encoding)
+        if encoding:
+            body = await run_stage("compress", len(body) > OFFLOAD_BYTES, compress, body, encoding)
+        response = (etag, body, media_type, encoding)
+        search_cache.set_response(key, variant, version, response, len(body))
+
+    etag, body, media_type, encoding = response
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
+
+
+@app.get("/api/expand")
+async def expand(
+    node: str = Query(..., min_length=1),
+    depth: int = Query(1, ge=1, le=MAX_EXPAND_DEPTH),
+    known: List[str] = Query([]),
+):
+    # Neighbourhood of a node (by link) from the persistent graph store,
+    # minus the nodes the client already has, so drilling into a node costs
+    # only the new part of the graph.
+    async with span("expand"):
+        delta = await run_measured(graph_store.expand, node, depth, known)
+    if delta is None:
+        raise HTTPException(status_code=404, detail="Unknown node")
+    return delta
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return await search_cache.stats()
+
+
+@app.get("/api/compute/stats")
+async def compute_stats():
+    return compute_pool.stats()
+
+
+@app.get("/api/metrics")
+async def metrics():
+    # Prometheus text format: request and per-stage histograms from the
+    # timing middleware, plus the cache and compute pool counters.
+    pool = compute_pool.stats()
+    families = [
+        ("mindmap_cache_events_total", "counter", "Search cache lookups and coalesced searches.",
+         [({"event": event}, count) for event, count in search_cache.counters.items()]),
+        ("mindmap_compute_jobs_total", "counter", "Compute pool jobs by outcome.",
+         [({"outcome": outcome}, pool[outcome]) for outcome in ("completed", "rejected", "cancelled", "failed")]),
+        ("mindmap_compute_restarts_total", "counter", "Times the worker processes were replaced after one died.",
+         [({}, pool["restarts"])]),
+        ("mindmap_compute_workers", "gauge", "Worker processes in the compute pool.", [({}, pool["workers"])]),
+        ("mindmap_compute_queued", "gauge", "Jobs waiting for a worker.", [({}, pool["queued"])]),
+        ("mindmap_compute_running", "gauge", "Jobs running on a worker.", [({}, pool["running"])]),
+        ("mindmap_compute_estimated_wait_seconds", "gauge", "Estimated wait for a new job.",
+         [({}, pool["estimated_wait_seconds"])]),
+    ]
+    return Response(render_metrics(families), media_type=PROMETHEUS)
+
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    # Profiles of requests sent with "X-Profile: 1" while the server runs
+    # with MINDMAP_PROFILING=1; the id is in the X-Profile-Id response header.
+    if profile_id not in profiles:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return Response(profiles[profile_id], media_type="text/plain")
+
+
+@app.post("/api/layout")
+async def layout_graph(request: Request, graph: Graph):
+    # Precomputed force-directed positions, so clients can skip running the
+    # simulation themselves.
+    nodes = [node.model_dump(exclude_none=True) for node in graph.nodes]
+    edges = [edge.model_dump() for edge in graph.edges]
+    positions = await until_disconnected(request, graph_layout(nodes, edges, client_key(request)))
+    return {"nodes": positions}
+
+
 
 # to run:
 # source venv/bin/activate
@@ -0,0 +1,304 @@
+import hashlib
+import json
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+# Forces mirror the d3 simulation in frontend/app/components/MindMap.tsx so a
+# precomputed layout looks the same as one settled in the browser.
+LINK_DISTANCE = 180.0
+LINK_STRENGTH = 0.3
+CHARGE_STRENGTH = -400.0
+COLLIDE_PADDING = 50.0
+ALPHA_START = 0.5
+ALPHA_MIN = 0.001
+ALPHA_DECAY = 0.015
+VELOCITY_DECAY = 0.4
+
+# Below this many nodes the exact O(n^2) repulsion is cheaper than the grid.
+GRID_THRESHOLD = 256
+# Depth cap for the grid hierarchy; the finest cell grows instead.
+GRID_MAX_LEVELS = 12
+
+LAYOUT_CACHE_SIZE = 128
+
+# MindMap.tsx's sizeMap: the size a node without one is drawn at, by topic.
+TOPIC_SIZES = {
+    "Fundamentals": 3,
+    "Mechanics": 2,
+    "Competitive": 2,
+    "Advanced Mechanics": 2,
+    "Tools": 1,
+    "Alternate Format": 1,
+    "Lore": 1,
+    "Generations": 1,
+}
+
+_layout_cache = OrderedDict()
+
+
+def node_size(node):
+    # Same fallbacks as the client: its own size, then its topic's, then 1.
+    return node.get("size") or TOPIC_SIZES.get(node.get("topic")) or 1
+
+
+def node_radius(node):
+    size = node_size(node)
+    return 28.0 if size == 3 else 20.0 if size == 2 else 14.0
+
+
+def graph_hash(nodes, edges):
+    # Only what affects the layout goes into the hash: node identity, size and
+    # the edge list.
+    payload = {
+        "nodes": [[node["title"], node_size(node)] for node in nodes],
+        "edges": [[edge["source"], edge["target"]] for edge in edges],
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def default_iterations():
+    # Number of ticks d3 runs before alpha drops below alphaMin.
+    return math.ceil(math.log(ALPHA_MIN / ALPHA_START) / math.log(1 - ALPHA_DECAY))
+
+
+def edge_indices(nodes, edges):
+    index = {node["title"]: i for i, node in enumerate(nodes)}
+    pairs = [
+        (index[edge["source"]], index[edge["target"]])
+        for edge in edges
+        if edge["source"] in index and edge["target"] in index
+    ]
+    if not pairs:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    src, dst = np.array(pairs, dtype=np.intp).T
+    return src, dst
+
+
+def initial_positions(n):
+    # d3's phyllotaxis arrangement: deterministic and free of coincident nodes.
+    i = np.arange(n, dtype=np.float64)
+    radius = 10.0 * np.sqrt(0.5 + i)
+    angle = i * math.pi * (3 - math.sqrt(5))
+    return np.column_stack((radius * np.cos(angle), radius * np.sin(angle)))
+
+
+def _scatter_add(target, index, values):
+    n = len(target)
+    target[:, 0] += np.bincount(index, values[:, 0], minlength=n)
+    target[:, 1] += np.bincount(index, values[:, 1], minlength=n)
+
+
+def _apply_links(pos, vel, src, dst, bias, alpha):
+    if not len(src):
+        return
+    delta = (pos[dst] + vel[dst]) - (pos[src] + vel[src])
+    length = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1e-6)
+    scale = (length - LINK_DISTANCE) / length * alpha * LINK_STRENGTH
+    delta *= scale[:, None]
+    _scatter_add(vel, dst, -delta * bias[:, None])
+    _scatter_add(vel, src, delta * (1 - bias)[:, None])
+
+
+def _pair_repulsion(pos, vel, alpha, i, j):
+    delta = pos[j] - pos[i]
+    dist2 = np.maximum((delta ** 2).sum(axis=1), 1.0)
+    _scatter_add(vel, i, delta * (CHARGE_STRENGTH * alpha / dist2)[:, None])
+
+
+def _apply_collisions(pos, vel, radii, i, j):
+    # Pairs must be unordered (i < j); both ends are pushed apart weighted by
+    # the other's squared radius, as in d3.forceCollide.
+    if not len(i):
+        return
+    delta = (pos[i] + vel[i]) - (pos[j] + vel[j])
+    reach = radii[i] + radii[j]
+    dist2 = (delta ** 2).sum(axis=1)
+    hit = dist2 < reach ** 2
+    if not hit.any():
+        return
+    i, j, delta, reach, dist2 = i[hit], j[hit], delta[hit], reach[hit], dist2[hit]
+    dist = np.maximum(np.sqrt(dist2), 1e-6)
+    delta *= ((reach - dist) / dist)[:, None]
+    ri2 = radii[i] ** 2
+    rj2 = radii[j] ** 2
+    share = rj2 / (ri2 + rj2)
+    _scatter_add(vel, i, delta * share[:, None])
+    _scatter_add(vel, j, -delta * (1 - share)[:, None])
+
+
+def exact_forces(pos, vel, alpha, radii):
+    n = len(pos)
+    i, j = np.triu_indices(n, k=1)
+    _pair_repulsion(pos, vel, alpha, np.concatenate((i, j)), np.concatenate((j, i)))
+    _apply_collisions(pos, vel, radii, i, j)
+
+
+def _near_pairs(coords):
+    # Node pairs (both orders) that share a cell or sit in adjacent cells. A
+    # padded (cells x max occupancy) member table lets every neighbouring pair
+    # of cells be expanded into node pairs at once.
+    n = len(coords)
+    height = int(coords[:, 1].max()) + 1
+    cell_ids, owner, counts = np.unique(
+        coords[:, 0] * height + coords[:, 1], return_inverse=True, return_counts=True
+    )
+    owner = owner.ravel()
+    cell_x = cell_ids // height
+    cell_y = cell_ids % height
+
+    order = np.argsort(owner, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    slots = np.arange(n) - starts[owner[order]]
+    members = np.full((len(cell_ids), int(counts.max())), -1, dtype=np.intp)
+    members[owner[order], slots] = order
+
+    sources = []
+    targets = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            ny = cell_y + dy
+            wanted = (cell_x + dx) * height + ny
+            found = np.searchsorted(cell_ids, wanted).clip(max=len(cell_ids) - 1)
+            valid = (ny >= 0) & (ny < height) & (cell_ids[found] == wanted)
+            if not valid.any():
+                continue
+            a, b = np.broadcast_arrays(
+                members[valid][:, :, None], members[found[valid]][:, None, :]
+            )
+            keep = (a >= 0) & (b >= 0) & (a != b)
+            sources.append(a[keep])
+            targets.append(b[keep])
+    return np.concatenate(sources), np.concatenate(targets)
+
+
+# Offsets from 2 * parent cell that enumerate the children of the parent's
+# 3x3 neighbourhood.
+_CHILD_X, _CHILD_Y = (axis.ravel() for axis in np.meshgrid(np.arange(-2, 4), np.arange(-2, 4), indexing="ij"))
+
+
+def grid_forces(pos, vel, alpha, radii):
+    # Barnes-Hut style approximation on a hierarchy of square grids. Pairs in
+    # the same or adjacent finest cells interact exactly (repulsion and
+    # collision). Further away, each node feels the centroids of the cells in
+    # its interaction list on every level: the children of its parent's
+    # neighbours that are not its own neighbours. Together the levels cover
+    # every other node once, at O(n log n) cost per tick.
+    low = pos.min(axis=0)
+    extent = max(float((pos.max(axis=0) - low).max()), 1.0)
+    size = max(2 * float(radii.max()), extent / 2 ** GRID_MAX_LEVELS)
+    coords = np.floor((pos - low) / size).astype(np.intp)
+
+    i, j = _near_pairs(coords)
+    _pair_repulsion(pos, vel, alpha, i, j)
+    upper = i < j
+    _apply_collisions(pos, vel, radii, i[upper], j[upper])
+
+    force_x = np.zeros(len(pos))
+    force_y = np.zeros(len(pos))
+    while coords.max() > 1:
+        width = int(coords.max()) + 6
+        cell_ids, first, owner, counts = np.unique(
+            (coords[:, 0] + 2) * width + coords[:, 1] + 2,
+            return_index=True, return_inverse=True, return_counts=True,
+        )
+        owner = owner.ravel()
+        centroid_x = np.bincount(owner, pos[:, 0]) / counts
+        centroid_y = np.bincount(owner, pos[:, 1]) / counts
+
+        # Interaction lists are resolved once per cell, then shared by its
+        # members.
+        cell = coords[first]
+        parent = cell // 2
+        cx = 2 * parent[:, 0:1] + _CHILD_X
+        cy = 2 * parent[:, 1:2] + _CHILD_Y
+        wanted = (cx + 2) * width + cy + 2
+        found = np.searchsorted(cell_ids, wanted).clip(max=len(cell_ids) - 1)
+        valid = (cell_ids[found] == wanted) & (
+            (np.abs(cx - cell[:, 0:1]) > 1) | (np.abs(cy - cell[:, 1:2]) > 1)
+        )
+        mass = np.where(valid, counts[found], 0)
+
+        found = found[owner]
+        dx = centroid_x[found] - pos[:, 0:1]
+        dy = centroid_y[found] - pos[:, 1:2]
+        weight = mass[owner] / np.maximum(dx * dx + dy * dy, 1.0)
+        force_x += (dx * weight).sum(axis=1)
+        force_y += (dy * weight).sum(axis=1)
+        coords //= 2
+
+    vel[:, 0] += force_x * (CHARGE_STRENGTH * alpha)
+    vel[:, 1] += force_y * (CHARGE_STRENGTH * alpha)
+
+
+def simulate(radii, src, dst, iterations=None, method="auto", positions=None):
+    n = len(radii)
+    if n == 0:
+        return np.zeros((0, 2))
+    if iterations is None:
+        iterations = default_iterations()
+    if method == "auto":
+        method = "exact" if n < GRID_THRESHOLD else "grid"
+    forces = exact_forces if method == "exact" else grid_forces
+
+    pos = initial_positions(n) if positions is None else np.array(positions, dtype=np.float64)
+    vel = np.zeros_like(pos)
+    collide_radii = np.asarray(radii, dtype=np.float64) + COLLIDE_PADDING
+
+    degree = np.bincount(np.concatenate((src, dst)), minlength=n).astype(np.float64)
+    bias = degree[src] / np.maximum(degree[src] + degree[dst], 1.0)
+
+    alpha = ALPHA_START
+    for _ in range(iterations):
+        alpha += (0 - alpha) * ALPHA_DECAY
+        _apply_links(pos, vel, src, dst, bias, alpha)
+        forces(pos, vel, alpha, collide_radii)
+        pos -= pos.mean(axis=0)
+        vel *= 1 - VELOCITY_DECAY
+        pos += vel
+    return pos
+
+
+def layout_energy(pos, src, dst, chunk=1024):
+    # Potential whose negative gradient gives the link and charge forces; lower
+    # is better. Computed exactly, so only meant for benchmarking.
+    energy = 0.0
+    if len(src):
+        delta = pos[dst] - pos[src]
+        length = np.hypot(delta[:, 0], delta[:, 1])
+        energy += 0.5 * LINK_STRENGTH * float(((length - LINK_DISTANCE) ** 2).sum())
+    for start in range(0, len(pos), chunk):
+        block = pos[start:start + chunk]
+        delta = block[:, None, :] - pos[None, :, :]
+        dist = np.sqrt(np.maximum((delta ** 2).sum(axis=2), 1.0))
+        rows = np.arange(start, start + len(block))
+        mask = np.arange(len(pos))[None, :] > rows[:, None]
+        energy += CHARGE_STRENGTH * float(np.log(dist)[mask].sum())
+    return energy
+
+
+def layout_positions(nodes, edges):
+    # Returns [{"title", "x", "y"}] centred on the origin. Uncached; pure, so
+    # it can run in a worker process.
+    radii = np.array([node_radius(node) for node in nodes], dtype=np.float64)
+    src, dst = edge_indices(nodes, edges)
+    pos = simulate(radii, src, dst)
+    return [
+        {"title": node["title"], "x": round(float(x), 2), "y": round(float(y), 2)}
+        for node, (x, y) in zip(nodes, pos)
+    ]
+
+
+def cached_layout(key):
+    layout = _layout_cache.get(key)
+    if layout is not None:
+        _layout_cache.move_to_end(key)
+    return layout
+
+
+def store_layout(key, layout):
+    _layout_cache[key] = layout
+    if len(_layout_cache) > LAYOUT_CACHE_SIZE:
+        _layout_cache.popitem(last=False)
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import threading
+
+from cache import CACHE_DIR
+
+MAX_EXPAND_DEPTH = 3
+MAX_EXPAND_NODES = 500
+# SQLite's default cap on bound parameters is 999 on older builds.
+QUERY_CHUNK = 900
+
+NODE_COLUMNS = ("link", "title", "overview", "topic", "size")
+
+
+def chunks(items, size=QUERY_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class GraphStore:
+    # Every generated graph is merged into one persistent graph in SQLite.
+    # Nodes are deduplicated by link. Each edge is stored in both directions
+    # in a WITHOUT ROWID table keyed by (src, dst), so a node's neighbours are
+    # one range scan of the primary key. Calls block, so async code goes
+    # through run_in_threadpool.
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "graph.sqlite3")):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS nodes ("
+                " id INTEGER PRIMARY KEY,"
+                " link TEXT NOT NULL UNIQUE,"
+                " title TEXT NOT NULL,"
+                " overview TEXT NOT NULL DEFAULT '',"
+                " topic TEXT NOT NULL DEFAULT '',"
+                " size INTEGER)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS edges ("
+                " src INTEGER NOT NULL,"
+                " dst INTEGER NOT NULL,"
+                " PRIMARY KEY (src, dst)) WITHOUT ROWID"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def add_graph(self, nodes, edges):
+        # Upserts nodes by link (newer non-empty fields win) and adds the
+        # edges between them. Returns the number of new edges.
+        nodes = [node for node in nodes if node.get("link")]
+        if not nodes:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT INTO nodes (link, title, overview, topic, size) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (link) DO UPDATE SET"
+                "  title = COALESCE(NULLIF(excluded.title, ''), title),"
+                "  overview = COALESCE(NULLIF(excluded.overview, ''), overview),"
+                "  topic = COALESCE(NULLIF(excluded.topic, ''), topic),"
+                "  size = COALESCE(excluded.size, size)",
+                [
+                    (node["link"], node.get("title") or node["link"], node.get("overview") or "",
+                     node.get("topic") or "", node.get("size"))
+                    for node in nodes
+                ],
+            )
+            ids = self._ids_for_links(conn, [node["link"] for node in nodes])
+            by_title = {node["title"]: ids[node["link"]] for node in nodes if node.get("title")}
+
+            pairs = set()
+            for edge in edges:
+                src = by_title.get(edge["source"])
+                dst = by_title.get(edge["target"])
+                if src is not None and dst is not None and src != dst:
+                    pairs.add((src, dst))
+                    pairs.add((dst, src))
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO edges (src, dst) VALUES (?, ?)", sorted(pairs))
+            added = (conn.total_changes - before) // 2
+            conn.commit()
+            return added
+
+    def _ids_for_links(self, conn, links):
+        ids = {}
+        for part in chunks(set(links)):
+            marks = ",".join("?" * len(part))
+            ids.update(conn.execute(f"SELECT link, id FROM nodes WHERE link IN ({marks})", part))
+        return ids
+
+    def _neighbours(self, conn, frontier):
+        found = set()
+        for part in chunks(frontier):
+            marks = ",".join("?" * len(part))
+            found.update(row[0] for row in conn.execute(f"SELECT dst FROM edges WHERE src IN ({marks})", part))
+        return found
+
+    def expand(self, link, depth=1, known=(), limit=MAX_EXPAND_NODES):
+        # Nodes within depth hops of link that the client does not already
+        # have (known links; link itself counts as known), plus the edges that
+        # connect them to each other and to known nodes. Returns None if link
+        # is not in the store. Cost depends on the neighbourhood, not on the
+        # size of the stored graph.
+        depth = max(1, min(depth, MAX_EXPAND_DEPTH))
+        with self._lock:
+            conn = self._connect()
+            ids = self._ids_for_links(conn, [link, *known])
+            if link not in ids:
+                return None
+            seed = ids[link]
+            known_ids = set(ids.values())
+
+            seen = {seed}
+            added = []
+            frontier = {seed}
+            for _ in range(depth):
+                frontier = self._neighbours(conn, frontier) - seen
+                if not frontier:
+                    break
+                seen |= frontier
+                added.extend(sorted(frontier - known_ids)[: limit - len(added)])
+                if len(added) >= limit:
+                    break
+
+            new_ids = set(added)
+            visible = new_ids | known_ids
+            edge_pairs = set()
+            rows = {}
+            for part in chunks(added):
+                marks = ",".join("?" * len(part))
+                for src, dst in conn.execute(f"SELECT src, dst FROM edges WHERE src IN ({marks})", part):
+                    if dst in visible:
+                        edge_pairs.add((min(src, dst), max(src, dst)))
+            for part in chunks(new_ids | {dst for pair in edge_pairs for dst in pair}):
+                marks = ",".join("?" * len(part))
+                for row in conn.execute(
+                    f"SELECT id, {', '.join(NODE_COLUMNS)} FROM nodes WHERE id IN ({marks})", part
+                ):
+                    rows[row[0]] = dict(zip(NODE_COLUMNS, row[1:]))
+
+        nodes = []
+        for node_id in added:
+            node = rows[node_id]
+            if node["size"] is None:
+                del node["size"]
+            nodes.append(node)
+        edges = [
+            {"source": rows[src]["title"], "target": rows[dst]["title"]}
+            for src, dst in sorted(edge_pairs)
+        ]
+        return {"nodes": nodes, "edges": edges}
+
+
+graph_store = GraphStore()
@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import json
+import struct
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for the msgpack format
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is used when brotli is unavailable
+    brotli = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# Bodies smaller than this are sent uncompressed.
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+NODE_FIELDS = ("link", "title", "overview", "topic")
+
+
+def dump_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compact_graph(graph):
+    # Columnar nodes (one list per field) and edges as a flat
+    # [source, target, source, target, ...] list of node indices, so no title
+    # is sent more than once.
+    nodes = graph["nodes"]
+    fields = list(NODE_FIELDS)
+    for node in nodes:
+        for field in node:
+            if field not in fields:
+                fields.append(field)
+
+    index = {}
+    for i, node in enumerate(nodes):
+        index.setdefault(node["title"], i)
+    edges = []
+    for edge in graph["edges"]:
+        source = index.get(edge["source"])
+        target = index.get(edge["target"])
+        if source is not None and target is not None:
+            edges.extend((source, target))
+
+    return {
+        "v": 1,
+        "count": len(nodes),
+        "nodes": {field: [node.get(field) for node in nodes] for field in fields},
+        "edges": edges,
+    }
+
+
+def pack_graph(graph):
+    # msgpack of the compact layout, with edges as packed little-endian uint32.
+    compact = compact_graph(graph)
+    compact["edges"] = struct.pack(f"<{len(compact['edges'])}I", *compact["edges"])
+    return msgpack.packb(compact, use_bin_type=True)
+
+
+def content_etag(body, encoding=None):
+    # Hash of the uncompressed body; the content coding is part of the tag
+    # because each coding is a different representation.
+    tag = hashlib.sha256(body).hexdigest()[:32]
+    if encoding:
+        tag += "-" + encoding
+    return '"' + tag + '"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def accepted_encodings(accept_encoding):
+    # Codings the client accepts, ignoring ones it rules out with q=0.
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding, size):
+    if size < MIN_COMPRESS_BYTES:
+        return None
+    return preferred_encoding(accept_encoding)
+
+
+def preferred_encoding(accept_encoding):
+    # The coding a large enough body would be sent with.
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+def serialize_graph(graph, fmt="json"):
+    # Returns (body, media_type). fmt is "json" for the existing {nodes,
+    # edges} shape, "compact" or "msgpack".
+    if fmt == "msgpack":
+        return pack_graph(graph), MSGPACK
+    if fmt == "compact":
+        return dump_json(compact_graph(graph)), JSON
+    return dump_json(graph), JSON
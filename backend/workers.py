@@ -0,0 +1,302 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi.concurrency import run_in_threadpool
+
+from instrument import add_cpu, measured, run_measured
+
+# Worker processes for CPU-bound stages. 0 keeps everything in this process
+# (on the thread pool), which is how the app behaved before the pool existed.
+WORKERS = int(os.environ.get("MINDMAP_WORKERS", max((os.cpu_count() or 1) - 1, 1)))
+# Queued jobs across all clients, and per client.
+MAX_QUEUE = 64
+MAX_QUEUE_PER_CLIENT = 8
+# Jobs are refused once the estimated wait for a new one exceeds this.
+MAX_WAIT_SECONDS = 10.0
+# Guess for the run time of a function no job has run yet. Each function's
+# estimate is then a moving average of its own jobs' run times.
+INITIAL_SERVICE_SECONDS = 0.2
+SERVICE_SMOOTHING = 0.2
+DISCONNECT_POLL_SECONDS = 0.1
+# Tries per job when worker processes die under it; see ComputePool._run.
+JOB_ATTEMPTS = 2
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__("compute queue is full")
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def _warm_worker():
+    # Runs once in every worker: import the numeric stack and run each stage
+    # on a tiny graph, so the first real job doesn't pay for imports and
+    # first-call setup.
+    from analytics import graph_annotations
+    from nuclear import layout_positions
+
+    nodes = [{"title": "a"}, {"title": "b"}, {"title": "c"}]
+    edges = [{"source": "a", "target": "b"}, {"source": "b", "target": "c"}]
+    layout_positions(nodes, edges)
+    graph_annotations(nodes, edges)
+
+
+def _ready():
+    return os.getpid()
+
+
+class _Job:
+    __slots__ = ("fn", "args", "future", "client", "estimate")
+
+    def __init__(self, fn, args, future, client, estimate):
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.client = client
+        self.estimate = estimate
+
+
+class ComputePool:
+    # Runs CPU-bound functions in a pool of warm worker processes, so they
+    # never block the event loop. Jobs wait in per-client queues that are
+    # served round-robin, so one busy client cannot starve the others. When
+    # the queue is full, or the estimated wait is too long, submit() raises
+    # Overloaded instead of queueing more work. The wait is the sum of the
+    # estimated run times of the queued and running jobs, tracked per
+    # function since a tokenize job and a layout differ by orders of
+    # magnitude.
+
+    def __init__(
+        self,
+        workers=WORKERS,
+        max_queue=MAX_QUEUE,
+        max_queue_per_client=MAX_QUEUE_PER_CLIENT,
+        max_wait=MAX_WAIT_SECONDS,
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.max_wait = max_wait
+        self.service_times = {}
+        self.counters = {"completed": 0, "rejected": 0, "cancelled": 0, "failed": 0, "restarts": 0}
+        self._executor = None
+        self._dispatchers = []
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._backlog = 0.0
+        self._ready = None
+        self._restarting = None
+
+    @property
+    def started(self):
+        return self._executor is not None
+
+    async def start(self):
+        if self.started or self.workers <= 0:
+            return
+        self._ready = asyncio.Condition()
+        self._restarting = asyncio.Lock()
+        self._executor = await self._spawn()
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def _spawn(self):
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+        loop = asyncio.get_running_loop()
+        # Workers are spawned lazily; make them all start (and warm up) now
+        # rather than on the first requests.
+        try:
+            await asyncio.gather(*(loop.run_in_executor(executor, _ready) for _ in range(self.workers)))
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return executor
+
+    async def _replace(self, broken):
+        # Swaps a broken executor for a freshly warmed one. Every job that was
+        # running on it fails at once, so only the first caller does the work.
+        async with self._restarting:
+            if self._executor is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = await self._spawn()
+            self.counters["restarts"] += 1
+
+    async def stop(self):
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()
+        self._queued = 0
+        self._backlog = 0.0
+        if self._executor is not None:
+            # Waits for running jobs to finish so no worker is left behind.
+            await run_in_threadpool(self._executor.shutdown, wait=True, cancel_futures=True)
+            self._executor = None
+
+    def service_time(self, fn):
+        return self.service_times.get(fn, INITIAL_SERVICE_SECONDS)
+
+    def estimated_wait(self):
+        if not self.started:
+            return 0.0
+        return max(self._backlog, 0.0) / self.workers
+
+    def check(self, client=None):
+        # Raises Overloaded if a job from client would be refused right now.
+        if not self.started:
+            return
+        full = self._queued >= self.max_queue
+        if client is not None:
+            full = full or len(self._queues.get(client, ())) >= self.max_queue_per_client
+        wait = self.estimated_wait()
+        if full or wait > self.max_wait:
+            self.counters["rejected"] += 1
+            raise Overloaded(retry_after=max(1, math.ceil(wait)))
+
+    async def submit(self, client, fn, *args, admit=True):
+        # Runs fn(*args) in a worker and returns its result. fn and args must
+        # be picklable. With admit=False the limits are skipped, for work that
+        # belongs to a request which was already admitted. Cancelling the
+        # caller drops the job if it has not started yet. The job's CPU time
+        # is charged to the caller's open span.
+        if not self.started:
+            return await run_measured(fn, *args)
+        if admit:
+            self.check(client)
+
+        job = _Job(fn, args, asyncio.get_running_loop().create_future(), client, self.service_time(fn))
+        self._queues.setdefault(client, deque()).append(job)
+        self._queued += 1
+        self._backlog += job.estimate
+        async with self._ready:
+            self._ready.notify()
+
+        try:
+            result, cpu = await job.future
+        except asyncio.CancelledError:
+            self._discard(job)
+            raise
+        add_cpu(cpu)
+        return result
+
+    def _discard(self, job):
+        queue = self._queues.get(job.client)
+        if queue is not None and job in queue:
+            queue.remove(job)
+            self._queued -= 1
+            self._backlog -= job.estimate
+            if not queue:
+                del self._queues[job.client]
+            self.counters["cancelled"] += 1
+
+    def _next_job(self):
+        # Round-robin over clients: take the head of the first client's queue
+        # and move that client to the back.
+        client, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        self._queued -= 1
+        if queue:
+            self._queues.move_to_end(client)
+        else:
+            del self._queues[client]
+        return job
+
+    async def _run(self, job):
+        # A worker that dies (killed, out of memory, crashed in native code)
+        # breaks its executor and fails every job running on it. The executor
+        # is replaced and each of those jobs is retried; a job that breaks
+        # the fresh pool as well is failed rather than retried forever.
+        loop = asyncio.get_running_loop()
+        for attempt in range(JOB_ATTEMPTS):
+            executor = self._executor
+            try:
+                return await loop.run_in_executor(executor, measured, job.fn, *job.args)
+            except BrokenProcessPool:
+                await self._replace(executor)
+                if attempt == JOB_ATTEMPTS - 1:
+                    raise
+
+    async def _dispatch(self):
+        while True:
+            async with self._ready:
+                await self._ready.wait_for(lambda: self._queued > 0)
+                job = self._next_job()
+            if job.future.done():
+                self._backlog -= job.estimate
+                continue
+
+            self._running += 1
+            started = time.perf_counter()
+            try:
+                result = await self._run(job)
+            except Exception as exc:
+                self.counters["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(exc)
+            else:
+                self.counters["completed"] += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self._running -= 1
+                self._backlog -= job.estimate
+                elapsed = time.perf_counter() - started
+                previous = self.service_times.get(job.fn)
+                if previous is None:
+                    self.service_times[job.fn] = elapsed
+                else:
+                    self.service_times[job.fn] = previous + SERVICE_SMOOTHING * (elapsed - previous)
+
+    def stats(self):
+        return {
+            **self.counters,
+            "workers": self.workers if self.started else 0,
+            "queued": self._queued,
+            "running": self._running,
+            "clients": len(self._queues),
+            "service_seconds": {fn.__name__: round(seconds, 4) for fn, seconds in self.service_times.items()},
+            "estimated_wait_seconds": round(self.estimated_wait(), 3),
+        }
+
+
+compute_pool = ComputePool()
+
+
+def client_key(request):
+    return request.client.host if request.client else "unknown"
+
+
+async def until_disconnected(request, awaitable):
+    # Awaits awaitable, cancelling it (and so dropping any queued compute
+    # job) if the client goes away first.
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()